@@ -0,0 +1,258 @@
+"""
+Long-lived pysway process that runs commands in an already warm interpreter.
+
+Start it once from the sway config:
+
+    exec pysway-daemon
+
+Key bindings created with SwayUtils.bind_input() then hand their command to
+the daemon over a Unix socket instead of starting python3, importing pysway
+and connecting to sway again on every key press. When the daemon is not
+running the command is executed locally, as before. The daemon serves a
+single sway instance and exits once its connection to sway is lost.
+
+The daemon also keeps the tree cached, dropping it on every window, workspace
+or output event, so scripts can ask it about views with query() instead of
+fetching and decoding the whole tree themselves.
+
+Requests are one per connection: a verb, a space and its argument, e.g.
+"EXEC utils.go_next_workspace_with_views()" or "VIEW 8". The reply is "OK",
+"OK <json>" for the VIEW, FOCUSED and VIEWS queries, "ERROR <message>", or
+"DISCONNECTED <message>" when the daemon has lost its sway connection.
+"""
+
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+from typing import Any, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+
+# How often serve() checks its sway connection while no client is talking,
+# and how long it waits on a client before dropping it
+_CHECK_INTERVAL = 1.0
+# How long a client waits for the daemon before giving up on it
+_CLIENT_TIMEOUT = 5.0
+
+
+def socket_path() -> str:
+    """
+    Path of the daemon socket, inside the user's runtime directory.
+
+    The runtime directory outlives a sway session, so the name includes the
+    sway socket's: a daemon left over from a previous session can't take the
+    place of the current one.
+    """
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid()}"
+    swaysock = os.getenv("SWAYSOCK")
+    if not swaysock:
+        return os.path.join(runtime_dir, "pysway.sock")
+    instance = os.path.splitext(os.path.basename(swaysock))[0]
+    return os.path.join(runtime_dir, f"pysway-{instance}.sock")
+
+
+def _namespace(watch: bool = False) -> Dict[str, Any]:
+    """
+    Globals available to executed commands, matching bind_input()'s preamble
+
+    Args:
+        watch (bool): Keep utils' tree cached between requests, for serve().
+            A one-off local command has no use for the event subscription.
+    """
+    from pysway.ipc import SwayIPC
+    from pysway.extra.utils import SwayUtils
+
+    sock = SwayIPC()
+    return {
+        "SwayIPC": SwayIPC,
+        "SwayUtils": SwayUtils,
+        "sock": sock,
+        "utils": SwayUtils(sock, watch=watch),
+    }
+
+
+def _read_all(conn: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def send(request: str, path: Optional[str] = None) -> str:
+    """
+    Send a single request to the daemon and return its reply.
+
+    Raises:
+        OSError: If the daemon is not running or doesn't answer in time.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(_CLIENT_TIMEOUT)
+        conn.connect(path or socket_path())
+        conn.sendall(request.encode("utf-8"))
+        conn.shutdown(socket.SHUT_WR)
+        return _read_all(conn).decode("utf-8")
+
+
+def query(verb: str, arg: str = "", path: Optional[str] = None) -> Any:
+    """
+    Ask the daemon for view data, e.g. query("VIEW", "8").
+
+    Args:
+        verb (str): VIEW (arg is the view ID), FOCUSED or VIEWS
+        arg (str): Argument of the request, if it takes one
+
+    Returns:
+        The decoded reply: a view dict, a list of views, or None if no view
+        matched.
+
+    Raises:
+        OSError: If the daemon is not running.
+        RuntimeError: If the daemon could not answer the query.
+    """
+    reply = send(f"{verb} {arg}".rstrip(), path)
+    status, _, data = reply.partition(" ")
+    if status == "DISCONNECTED":
+        # Callers fall back to their own connection, as if it wasn't running
+        raise ConnectionError(reply)
+    if status != "OK":
+        raise RuntimeError(reply)
+    return json.loads(data)
+
+
+def _query(verb: str, arg: str, namespace: Dict[str, Any]) -> Any:
+    sock = namespace["sock"]
+    if verb == "VIEW":
+        return sock.get_view(int(arg), timeout=0)
+    tree = sock.get_tree()
+    if verb == "FOCUSED":
+        return sock.get_focused_view(tree)
+    return sock.list_views(tree)
+
+
+def _sway_connected(namespace: Dict[str, Any]) -> bool:
+    # The event thread stops watching when sway closes that connection
+    return namespace["utils"]._watching and namespace["sock"].is_connected()
+
+
+def _handle(request: str, namespace: Dict[str, Any]) -> str:
+    verb, _, arg = request.partition(" ")
+    if verb == "PING":
+        return "OK" if _sway_connected(namespace) else "DISCONNECTED"
+    if verb == "EXEC":
+        try:
+            exec(arg, namespace)
+        except Exception as e:
+            if not _sway_connected(namespace):
+                return f"DISCONNECTED {e}"
+            log.exception("Command failed: %s", arg)
+            return f"ERROR {e}"
+        finally:
+            # The code may have changed sway through another connection
+            namespace["sock"].invalidate_tree()
+        return "OK"
+    if verb in ("VIEW", "FOCUSED", "VIEWS"):
+        try:
+            return f"OK {json.dumps(_query(verb, arg, namespace))}"
+        except Exception as e:
+            if not _sway_connected(namespace):
+                return f"DISCONNECTED {e}"
+            log.exception("Query failed: %s", request)
+            return f"ERROR {e}"
+    return f"ERROR Unknown request {verb!r}"
+
+
+def _is_running(path: str) -> bool:
+    try:
+        return send("PING", path) == "OK"
+    except OSError:
+        return False
+
+
+def serve(path: Optional[str] = None) -> None:
+    """Run the daemon until interrupted"""
+    path = path or socket_path()
+    if _is_running(path):
+        raise RuntimeError(f"pysway daemon already running on {path}")
+    if os.path.exists(path):
+        os.unlink(path)
+
+    namespace = _namespace(watch=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Commands are executed as Python, so only the owner may connect
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    bound = os.stat(path)
+    server.listen()
+    server.settimeout(_CHECK_INTERVAL)
+    log.info("Listening on %s", path)
+
+    try:
+        while _sway_connected(namespace):
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                # The daemon is single-threaded, a client that never finishes
+                # its request must not hold up everyone else
+                conn.settimeout(_CHECK_INTERVAL)
+                try:
+                    request = _read_all(conn).decode("utf-8").strip()
+                    conn.sendall(_handle(request, namespace).encode("utf-8"))
+                except OSError as e:
+                    # socket.timeout included
+                    log.warning("Dropped client: %s", e)
+        log.info("Lost the sway connection, exiting")
+    finally:
+        server.close()
+        # A newer daemon may have replaced a disconnected one's socket
+        try:
+            if os.path.samestat(os.stat(path), bound):
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def run(code: str) -> None:
+    """Execute code in the daemon, or in this process if it is not running"""
+    try:
+        reply = send(f"EXEC {code}")
+    except OSError:
+        reply = "DISCONNECTED"
+    if reply.startswith("DISCONNECTED"):
+        exec(code, _namespace())
+    elif reply != "OK":
+        raise RuntimeError(reply)
+
+
+def main(argv=None) -> None:
+    """
+    pysway-daemon            run the daemon
+    pysway-daemon exec CODE  run CODE in the daemon (or locally as a fallback)
+    """
+    args = sys.argv[1:] if argv is None else argv
+    if not args:
+        logging.basicConfig(level=logging.INFO)
+        # Exit through serve()'s cleanup when sway or the user stops us
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            serve()
+        except KeyboardInterrupt:
+            pass
+    elif args[0] == "exec" and len(args) == 2:
+        run(args[1])
+    else:
+        sys.exit(main.__doc__)
+
+
+if __name__ == "__main__":
+    main()
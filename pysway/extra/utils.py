@@ -1,29 +1,139 @@
+import logging
+import threading
+from contextlib import contextmanager
 from typing import Dict, Any, Optional, List
-from itertools import islice, cycle
-
-# Message type from sway IPC docs
-RUN_COMMAND = 0
-GET_WORKSPACES = 1
-SUBSCRIBE = 2
-GET_OUTPUTS = 3
-GET_TREE = 4
-GET_MARKS = 5
-GET_BAR_CONFIG = 6
-GET_VERSION = 7
-GET_BINDING_MODES = 8
-GET_CONFIG = 9
-SEND_TICK = 10
-SYNC = 11
-GET_BINDING_STATE = 12
-GET_INPUTS = 100
-GET_SEATS = 101
+
+from pysway.ipc import RUN_COMMAND, SwayIPC, _VIEW_TYPES
+
+log = logging.getLogger(__name__)
+
+# Not part of the sway IPC message types in pysway.ipc
 BIND_INPUT = 102
 
+# View criteria, indexed by is_xwayland_view()
+_SELECTOR_FORMATS = ("[con_id={}]", "[id={}]")
+
+
+def _workspace_views(workspace: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Immediate con/floating_con children of a workspace node"""
+    return [
+        node
+        for node in workspace.get("nodes", ())
+        if isinstance(node, dict) and node.get("type") in _VIEW_TYPES
+    ]
+
+
+def _workspace_has_view(workspace: Dict[str, Any]) -> bool:
+    return any(
+        isinstance(node, dict) and node.get("type") in _VIEW_TYPES
+        for node in workspace.get("nodes", ())
+    )
+
+
+def _iter_workspace_nodes(tree):
+    # sway's tree is root -> outputs -> workspaces, so workspaces never
+    # need to be searched for below the second level
+    for output in tree.get("nodes", ()):
+        if not isinstance(output, dict):
+            continue
+        for node in output.get("nodes", ()):
+            if isinstance(node, dict) and node.get("type") == "workspace":
+                yield node
+
+
+def _iter_workspaces(tree):
+    """Yield (workspace, views) for every workspace node, in tree order"""
+    for workspace in _iter_workspace_nodes(tree):
+        yield workspace, _workspace_views(workspace)
+
+
+def _find_workspace(tree, workspace_id: int) -> Optional[Dict[str, Any]]:
+    """Return the workspace node with the given ID, stopping at the first match"""
+    for workspace in _iter_workspace_nodes(tree):
+        if workspace.get("id") == workspace_id:
+            return workspace
+    return None
+
 
 class SwayUtils:
-    def __init__(self, socket):
-        self._sock = socket
+    def __init__(self, socket: Optional[SwayIPC] = None, watch: bool = False):
+        """
+        Args:
+            socket (Optional[SwayIPC]): Connection used for queries and
+                commands. When omitted, one is opened on first use.
+            watch (bool): Keep the tree cached between calls and drop it
+                whenever sway reports a window, workspace or output event.
+                The events are read by a background thread on a second
+                connection.
+        """
+        self._sock_impl = socket
         self.floating_views = {}
+        self._watching = False
+        if watch:
+            self._start_watching()
+
+    @property
+    def _sock(self) -> SwayIPC:
+        sock = self._sock_impl
+        if sock is None:
+            sock = self._sock_impl = SwayIPC()
+        return sock
+
+    def _start_watching(self) -> None:
+        sock = self._sock
+        events = SwayIPC()
+        events.watch(["window", "workspace", "output"])
+        self._watching = True
+        sock.keep_tree()
+        threading.Thread(
+            target=self._event_loop, args=(sock, events), daemon=True
+        ).start()
+
+    def _event_loop(self, sock: SwayIPC, events: SwayIPC) -> None:
+        try:
+            # iter_events() skips undecodable events, only EOF ends the loop
+            for _ in events.iter_events():
+                sock.invalidate_tree()
+        except OSError:
+            pass
+        finally:
+            # Without events the cache can no longer be trusted between calls
+            self._watching = False
+            sock.keep_tree(False)
+            events.close()
+
+    @contextmanager
+    def tree_snapshot(self):
+        """
+        Reuse a single get_tree() result for every query made inside the block,
+        including the SwayIPC helpers called along the way.
+
+        The snapshot is dropped as soon as a command is sent to sway, so the
+        next query after a command always sees the updated tree.
+        """
+        with self._sock.tree_snapshot():
+            yield self
+
+    def _selector(self, view: Dict[str, Any]) -> str:
+        """Criteria matching a view: [id=] for XWayland, [con_id=] for Wayland"""
+        return _SELECTOR_FORMATS[self._sock.is_xwayland_view(view)].format(view["id"])
+
+    def _get_focused_output(self) -> Optional[int]:
+        """Return the focused output ID from the (cached) tree"""
+        tree = self._sock.get_tree()
+        if not hasattr(tree, "get"):
+            return None
+        return (tree.get("focus") or [None])[0]
+
+    def _get_output(self, output_id: int) -> Optional[Dict[str, Any]]:
+        """Return the output node with the given ID from the (cached) tree"""
+        tree = self._sock.get_tree()
+        if not hasattr(tree, "get"):
+            return None
+        for node in tree.get("nodes", ()):
+            if node.get("type") == "output" and node.get("id") == output_id:
+                return node
+        return None
 
     def show_desktop(self, output_id: int) -> None:
         """
@@ -35,15 +145,16 @@ class SwayUtils:
             output_id (int): ID of the output
         """
         # Step 1: Get current workspace info for the given output
-        workspace_info = self._sock.get_output(output_id, key="current_workspace")
+        output_node = self._sock.get_output(output_id) or {}
+        workspace_info = output_node.get("current_workspace")
         if not workspace_info:
-            print(f"Output {output_id} has no current workspace")
+            log.warning("Output %s has no current workspace", output_id)
             return
 
         # Step 2: Get all nodes from the output
-        output_nodes = self._sock.get_output(output_id, key="nodes")
+        output_nodes = output_node.get("nodes")
         if not isinstance(output_nodes, list):
-            print(f"Expected list for output nodes, got {type(output_nodes)}")
+            log.warning("Expected list for output nodes, got %s", type(output_nodes))
             return
 
         # Step 3: Find the workspace node among output nodes
@@ -55,41 +166,36 @@ class SwayUtils:
                     break
 
         if not workspace_node:
-            print(f"Workspace {workspace_info} not found in output {output_id}")
+            log.warning(
+                "Workspace %s not found in output %s", workspace_info, output_id
+            )
             return
 
-        # Step 4: Extract views from the workspace
-        workspace_views = [
-            node
-            for node in workspace_node.get("nodes", [])
-            if isinstance(node, dict) and node.get("type") in ["con", "floating_con"]
-        ]
-
-        if not workspace_views:
-            print(f"No views found in workspace {workspace_info}")
-            return
+        # Step 4: Collect view selectors and the scratchpad state in one pass
+        selectors = []
+        all_in_scratchpad = True
+        for view in workspace_node.get("nodes", ()):
+            if not isinstance(view, dict) or view.get("type") not in _VIEW_TYPES:
+                continue
 
-        # Step 5: Determine action based on scratchpad state (only for current workspace views)
-        all_in_scratchpad = all(
-            view.get("scratchpad_state") == "fresh" for view in workspace_views
-        )
+            if view.get("scratchpad_state") != "fresh":
+                all_in_scratchpad = False
 
-        # Step 6: Apply action
-        for view in workspace_views:
-            view_id = view["id"]
+            selectors.append(self._selector(view))
 
-            # Use [id=] for XWayland, [con_id=] for Wayland
-            if self._sock.is_xwayland_view(view):
-                selector = f"[id={view_id}]"
-            else:
-                selector = f"[con_id={view_id}]"
+        if not selectors:
+            log.debug("No views found in workspace %s", workspace_info)
+            return
 
-            if all_in_scratchpad:
-                # Restore from scratchpad
-                self._sock._send(0, f"{selector} scratchpad show")
-            else:
-                # Move to scratchpad
-                self._sock._send(0, f"{selector} move scratchpad")
+        # Step 5: Restore everything from the scratchpad if all views are
+        # already there, otherwise move them all to it, in a single message
+        if all_in_scratchpad:
+            action = "scratchpad show"
+        else:
+            action = "move scratchpad"
+        self._sock._send(
+            RUN_COMMAND, "; ".join(f"{selector} {action}" for selector in selectors)
+        )
 
     def get_workspace_with_views(self) -> List[Dict[str, Any]]:
         """
@@ -102,28 +208,11 @@ class SwayUtils:
         if not tree:
             return []
 
-        result = []
-
-        def traverse(node):
-            if not isinstance(node, dict):
-                return
-
-            if node.get("type") == "workspace":
-                # Extract only immediate child views
-                views = [
-                    child
-                    for child in node.get("nodes", [])
-                    if isinstance(child, dict)
-                    and child.get("type") in ["con", "floating_con"]
-                ]
-                if views:
-                    result.append({"workspace": node, "views": views})
-            elif node.get("nodes") or node.get("floating_nodes"):
-                for child in node.get("nodes", []) + node.get("floating_nodes", []):
-                    traverse(child)
-
-        traverse(tree)
-        return result
+        return [
+            {"workspace": workspace, "views": views}
+            for workspace, views in _iter_workspaces(tree)
+            if views
+        ]
 
     def get_views_from_workspace(self, workspace_number: int) -> List[Dict[str, Any]]:
         """
@@ -139,34 +228,11 @@ class SwayUtils:
         if not tree:
             return []
 
-        # Find the workspace node
-        workspace_node = None
-
-        def find_workspace(node):
-            nonlocal workspace_node
-            if isinstance(node, dict):
-                if (
-                    node.get("type") == "workspace"
-                    and node.get("id") == workspace_number
-                ):
-                    workspace_node = node
-                    return
-                for child in node.get("nodes", []) + node.get("floating_nodes", []):
-                    find_workspace(child)
-
-        find_workspace(tree)
-
+        workspace_node = _find_workspace(tree, workspace_number)
         if not workspace_node:
             return []
 
-        # Extract views from the workspace
-        views = [
-            node
-            for node in workspace_node.get("nodes", [])
-            if isinstance(node, dict) and node.get("type") in ["con", "floating_con"]
-        ]
-
-        return views
+        return _workspace_views(workspace_node)
 
     def get_workspaces_from_focused_output(self) -> List[Dict[str, Any]]:
         """
@@ -176,26 +242,26 @@ class SwayUtils:
             List of workspace dictionaries from the focused output
         """
         # Step 1: Get focused output ID
-        focused_output_id = self._sock.get_focused_output()
+        focused_output_id = self._get_focused_output()
         if not isinstance(focused_output_id, int):
-            print("Focused output ID is not an integer")
+            log.warning("Focused output ID is not an integer")
             return []
 
         # Step 2: Get output node by ID
-        output_node = self._sock.get_output(focused_output_id)
+        output_node = self._get_output(focused_output_id)
         if not output_node:
-            print(f"Failed to get output with ID {focused_output_id}")
+            log.warning("Failed to get output with ID %s", focused_output_id)
             return []
 
         # Step 3: Extract only workspace nodes
         workspaces = [
             node
-            for node in output_node.get("nodes", [])
+            for node in output_node.get("nodes", ())
             if isinstance(node, dict) and node.get("type") == "workspace"
         ]
 
         if not workspaces:
-            print(f"No workspaces found on output {focused_output_id}")
+            log.debug("No workspaces found on output %s", focused_output_id)
 
         return workspaces
 
@@ -206,29 +272,45 @@ class SwayUtils:
         Returns:
             Optional[Dict]: The focused workspace dictionary, or None if not found.
         """
-        focused_output_id = self._sock.get_focused_output()
-        if not isinstance(focused_output_id, int):
-            return None
-
-        # Step 2: Get full output node
-        output_node = self._sock.get_output(focused_output_id)
-        if not output_node:
-            return None
+        with self.tree_snapshot():
+            focused_output_id = self._get_focused_output()
+            if not isinstance(focused_output_id, int):
+                return None
+
+            # Step 2: Get full output node
+            output_node = self._get_output(focused_output_id)
+            if not output_node:
+                return None
+
+            # Step 3: Get current workspace name
+            current_workspace_name = output_node.get("current_workspace")
+            if not current_workspace_name:
+                return None
+
+            # Step 4: Find the matching workspace node
+            for node in output_node.get("nodes", ()):
+                if (
+                    isinstance(node, dict)
+                    and node.get("type") == "workspace"
+                    and node.get("name") == current_workspace_name
+                ):
+                    return node
 
-        # Step 3: Get current workspace name
-        current_workspace_name = output_node.get("current_workspace")
-        if not current_workspace_name:
             return None
 
-        # Step 4: Find the matching workspace node
-        for node in self.get_workspaces_from_focused_output():
-            if (
-                node.get("type") == "workspace"
-                and node.get("name") == current_workspace_name
-            ):
-                return node
+    def _list_workspaces(self) -> List[Dict[str, Any]]:
+        """Flat GET_WORKSPACES list, for when only names/rects are needed"""
+        workspaces = self._sock.list_workspaces()
+        if not isinstance(workspaces, list):
+            return []
+        return workspaces
 
-        return None
+    def _list_focused_output_workspaces(self) -> List[Dict[str, Any]]:
+        workspaces = self._list_workspaces()
+        focused_output = next(
+            (ws.get("output") for ws in workspaces if ws.get("focused")), None
+        )
+        return [ws for ws in workspaces if ws.get("output") == focused_output]
 
     def get_output_by_name(self, name) -> Optional[Dict[str, Any]]:
         """Find output by its name (e.g., 'DP-1')"""
@@ -240,10 +322,22 @@ class SwayUtils:
             return None
 
     def get_next_workspace_with_views(self) -> Optional[str]:
-        workspaces = self.get_workspaces_from_focused_output()
+        # Read the workspaces and the current one from the same output node
+        with self.tree_snapshot():
+            output_node = self._get_output(self._get_focused_output())
+        if not output_node:
+            return None
+
+        workspaces = [
+            node
+            for node in output_node.get("nodes", ())
+            if isinstance(node, dict) and node.get("type") == "workspace"
+        ]
         if not workspaces:
             return None
 
+        current_name = output_node.get("current_workspace")
+        current_idx = None
         seen = set()
         non_empty_names = []
 
@@ -253,24 +347,15 @@ class SwayUtils:
                 continue
             seen.add(name)
 
-            for node in ws.get("nodes", []):
-                if isinstance(node, dict) and node.get("type") in [
-                    "con",
-                    "floating_con",
-                ]:
-                    non_empty_names.append(name)
-                    break
+            if _workspace_has_view(ws):
+                if name == current_name:
+                    current_idx = len(non_empty_names)
+                non_empty_names.append(name)
 
         if not non_empty_names:
             return None
 
-        current_workspace = self.get_focused_workspace()
-        if not current_workspace:
-            return non_empty_names[0]
-
-        try:
-            current_idx = non_empty_names.index(current_workspace["name"])
-        except ValueError:
+        if current_idx is None:
             return non_empty_names[0]
 
         next_idx = (current_idx + 1) % len(non_empty_names)
@@ -287,21 +372,23 @@ class SwayUtils:
         self._sock.run_command(f"workspace {workspace_name}")
 
     def move_view_to_workspace(self, view_id: int, workspace_name: str) -> bool:
-        view = self._sock.get_view(view_id)
+        view = self._sock.get_view(view_id, timeout=0)
         if not view:
-            print(f"View {view_id} not found")
+            log.warning("View %s not found", view_id)
             return False
 
-        if self._sock.is_xwayland_view(view):
-            selector = f"[id={view_id}]"
-        else:
-            selector = f"[con_id={view_id}]"
+        return self._move_view_to_workspace(view, workspace_name)
+
+    def _move_view_to_workspace(
+        self, view: Dict[str, Any], workspace_name: str
+    ) -> bool:
+        selector = self._selector(view)
 
         try:
-            self._sock._send(0, f"{selector} move workspace {workspace_name}")
+            self._sock._send(RUN_COMMAND, f"{selector} move workspace {workspace_name}")
             return True
         except Exception as e:
-            print(f"[ERROR] Failed to move view {view_id}: {e}")
+            log.error("Failed to move view %s: %s", view["id"], e)
             return False
 
     def move_view_to_new_empty_workspace(self, view_id: int) -> bool:
@@ -315,69 +402,66 @@ class SwayUtils:
             bool: True if successful, False otherwise.
         """
         # Get the view data
-        view = self._sock.get_view(view_id)
+        view = self._sock.get_view(view_id, timeout=0)
         if not view:
-            print(f"[ERROR] View {view_id} not found.")
+            log.error("View %s not found", view_id)
             return False
 
-        # Determine selector based on view type
-        if self._sock.is_xwayland_view(view):
-            selector = f"[id={view_id}]"
-        else:
-            selector = f"[con_id={view_id}]"
-
         # Get the view's PID
         pid = view.get("pid")
         if not pid or not isinstance(pid, int):
-            print(
-                f"[WARNING] View {view_id} has no valid PID. Using fallback workspace name."
+            log.warning(
+                "View %s has no valid PID. Using fallback workspace name.", view_id
             )
             workspace_name = "unknown"
         else:
             workspace_name = str(pid)
 
         # Check if the target workspace already exists
-        existing_workspaces = self.get_workspaces_from_focused_output()
-        workspace_names = [ws["name"] for ws in existing_workspaces]
-
-        if workspace_name not in workspace_names:
+        if not any(
+            ws.get("name") == workspace_name
+            for ws in self._list_focused_output_workspaces()
+        ):
             try:
                 # Create the new workspace
                 self._sock.run_command(f"workspace {workspace_name}")
-                print(f"[INFO] Created new workspace '{workspace_name}'")
+                log.info("Created new workspace '%s'", workspace_name)
             except Exception as e:
-                print(f"[ERROR] Failed to create workspace '{workspace_name}': {e}")
+                log.error("Failed to create workspace '%s': %s", workspace_name, e)
                 return False
 
         # Move the view to the target workspace
         try:
-            success = self.move_view_to_workspace(view_id, workspace_name)
+            success = self._move_view_to_workspace(view, workspace_name)
             if success:
-                print(
-                    f"[INFO] Successfully moved view {view_id} to workspace '{workspace_name}'"
+                log.info(
+                    "Successfully moved view %s to workspace '%s'",
+                    view_id,
+                    workspace_name,
                 )
             else:
-                print(
-                    f"[ERROR] Failed to move view {view_id} to workspace '{workspace_name}'"
+                log.error(
+                    "Failed to move view %s to workspace '%s'", view_id, workspace_name
                 )
             return success
         except Exception as e:
-            print(f"[ERROR] Unexpected error while moving view {view_id}: {e}")
+            log.error("Unexpected error while moving view %s: %s", view_id, e)
             return False
 
     def bind_input(self, identifier: str, command: str, import_str=None) -> None:
         """
         Bind a key or mouse button to a Sway command at runtime.
         To call a Python function, wrap it in `exec python3 -c ...`.
+
+        Without import_str the command is handed to pysway-daemon, which runs
+        it with `sock` and `utils` already connected, and falls back to
+        running it locally when the daemon is not up.
         """
         if import_str is None:
-            import_str = """from pysway.ipc import SwayIPC;\
-                            from pysway.extra.utils import SwayUtils;\
-                            sock = SwayIPC();\
-                            utils = SwayUtils(sock);\
-                          """.strip()
-        payload = f'{identifier} exec python3 -c "{import_str}{command}"'
-        print(payload)
+            payload = f'{identifier} exec python3 -m pysway.daemon exec "{command}"'
+        else:
+            payload = f'{identifier} exec python3 -c "{import_str}{command}"'
+        log.debug("Binding %s", payload)
         self._sock._send(BIND_INPUT, payload)
 
     def go_next_view_in_workspace(self):
@@ -403,20 +487,11 @@ class SwayUtils:
             idx = next(i for i, v in enumerate(views) if v["id"] == focused_id)
             next_idx = (idx + 1) % len(views)
             next_view = views[next_idx]
-            if self._sock.is_xwayland_view(next_view):
-                self._sock.run_command(f"[id={next_view['id']}] focus")
-            else:
-                self._sock.run_command(f"[con_id={next_view['id']}] focus")
+            self._sock.run_command(f"{self._selector(next_view)} focus")
         except StopIteration:
             # Fallback: just focus any view
             if views:
-                v = views[0]
-                selector = (
-                    "[id={}]".format(v["id"])
-                    if self._sock.is_xwayland_view(v)
-                    else "[con_id={}]".format(v["id"])
-                )
-                self._sock.run_command(f"{selector} focus")
+                self._sock.run_command(f"{self._selector(views[0])} focus")
 
     def maximize_view(self, view_id: int) -> bool:
         """
@@ -429,32 +504,29 @@ class SwayUtils:
             bool: True if successful, False otherwise.
         """
         # Get the focused workspace's geometry
-        workspace = self.get_focused_workspace()
+        workspace = next(
+            (ws for ws in self._list_workspaces() if ws.get("focused")), None
+        )
         if not workspace:
-            print("[ERROR] Could not find focused workspace.")
+            log.error("Could not find focused workspace.")
             return False
 
         rect = workspace.get("rect")
         if not rect:
-            print("[ERROR] Focused workspace has no 'rect' property.")
+            log.error("Focused workspace has no 'rect' property.")
             return False
 
         width = rect.get("width", 1920)
         height = rect.get("height", 1080)
 
         # Enable floating mode before resizing
-        view = self._sock.get_view(view_id)
+        view = self._sock.get_view(view_id, timeout=0)
         if not view:
-            print(f"[ERROR] View with ID {view_id} not found.")
+            log.error("View with ID %s not found.", view_id)
             return False
 
         try:
-            if self._sock.is_xwayland_view(view):
-                selector = f"[id={view_id}]"
-            else:
-                selector = f"[con_id={view_id}]"
-
-            self._sock.run_command(f"{selector} floating enable")
+            self._sock.run_command(f"{self._selector(view)} floating enable")
 
             # Resize and reposition the view to fill the workspace
             success = self._sock.configure_view(
@@ -462,12 +534,12 @@ class SwayUtils:
             )
 
             if success:
-                print(f"[INFO] Successfully maximized view {view_id}.")
+                log.info("Successfully maximized view %s.", view_id)
             else:
-                print(f"[ERROR] Failed to maximize view {view_id}.")
+                log.error("Failed to maximize view %s.", view_id)
 
             return success
 
         except Exception as e:
-            print(f"[ERROR] Failed to maximize view {view_id}: {e}")
+            log.error("Failed to maximize view %s: %s", view_id, e)
             return False
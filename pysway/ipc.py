@@ -1,10 +1,28 @@
+import logging
 import socket
 import struct
 import json
+import threading
 import time
-from typing import Dict, Any, Optional, List
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, List, Tuple
 import os
 
+# orjson and msgspec decode large GET_TREE replies several times faster than
+# json; all of them raise ValueError subclasses on malformed input
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    try:
+        from msgspec.json import Decoder as _JSONDecoder
+
+        # one reusable decoder instead of msgspec.json.decode() per reply
+        _json_loads = _JSONDecoder().decode
+    except ImportError:
+        from json import loads as _json_loads
+
+log = logging.getLogger(__name__)
+
 # Message type from sway IPC docs
 RUN_COMMAND = 0
 GET_WORKSPACES = 1
@@ -22,10 +40,140 @@ GET_BINDING_STATE = 12
 GET_INPUTS = 100
 GET_SEATS = 101
 
+# Every IPC message starts with: magic, payload length, message type
+_MAGIC = b"i3-ipc"
+_HEADER = struct.Struct("=6sII")
+_RECV_SIZE = 64 * 1024
+_SOCKET_BUFFER_SIZE = 1 << 20
+
+# Node types that represent views (windows) in the sway tree
+_VIEW_TYPES = frozenset(("con", "floating_con"))
+
+
+def _walk(root):
+    """
+    Yield every node below and including root in depth-first order, tiled
+    children before floating ones, without recursion.
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        yield node
+        floating = node.get("floating_nodes")
+        if floating:
+            stack.extend(reversed(floating))
+        nodes = node.get("nodes")
+        if nodes:
+            stack.extend(reversed(nodes))
+
+
+def _follow_focus(root) -> Optional[Dict[str, Any]]:
+    """
+    Descend through each node's most recently focused child until reaching
+    the focused node, visiting one branch per level instead of the whole tree.
+
+    Returns:
+        dict or None: The focused node, or None if the focus stacks do not lead
+        to it (in which case callers fall back to a full walk).
+    """
+    node = root
+    while isinstance(node, dict) and not node.get("focused"):
+        focus = node.get("focus")
+        if not focus:
+            return None
+        target = focus[0]
+        node = next(
+            (
+                child
+                for children in (node.get("nodes", ()), node.get("floating_nodes", ()))
+                for child in children
+                if child.get("id") == target
+            ),
+            None,
+        )
+    return node
+
+
+class CommandBatch:
+    """
+    Sway commands chained with ';' into one RUN_COMMAND message.
+
+        with sway.batch() as batch:
+            batch.add(f"[id={view_id}] minimize disable")
+            batch.add(f"[id={view_id}] focus")
+    """
+
+    def __init__(self, ipc: "SwayIPC"):
+        self._ipc = ipc
+        self._commands: List[str] = []
+
+    def add(self, cmd: str) -> "CommandBatch":
+        """Queue a command; each one carries its own criteria"""
+        self._commands.append(cmd)
+        return self
+
+    def send(self) -> None:
+        """Run the queued commands, if any, and start over"""
+        if self._commands:
+            self._ipc.run_command("; ".join(self._commands))
+            self._commands = []
+
+    def __enter__(self) -> "CommandBatch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.send()
+
 
 class SwayIPC:
-    def __init__(self):
+    __slots__ = (
+        "sock",
+        "_tree_ttl",
+        "_tree_cache",
+        "_tree_ts",
+        "_tree_snapshots",
+        "_tree_kept",
+        "_tree_lock",
+        "_tree_generation",
+        "_id_index",
+        "_pending_replies",
+        "_rxbuf",
+        "_scratch",
+        "_scratch_view",
+    )
+
+    def __init__(self, tree_ttl: float = 0.0):
+        """
+        Args:
+            tree_ttl (float): Seconds a get_tree() reply may be reused by the
+                following calls. With the default of 0 every call fetches a
+                fresh tree, except inside tree_snapshot().
+        """
         self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Room for whole tree replies, event bursts and command batches
+        # without partial reads or sendall() stalls; the kernel caps these
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, _SOCKET_BUFFER_SIZE)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _SOCKET_BUFFER_SIZE)
+        self._tree_ttl = tree_ttl
+        self._tree_cache = None
+        self._tree_ts = 0.0
+        self._tree_snapshots = 0
+        # keep_tree(): cache until invalidate_tree(), for event-driven callers
+        self._tree_kept = False
+        # invalidate_tree() may be called from an event thread
+        self._tree_lock = threading.Lock()
+        self._tree_generation = 0
+        # (tree, id -> node) for the most recently indexed cached tree
+        self._id_index = None
+        # RUN_COMMAND replies not read yet, skipped by the next _recv()
+        self._pending_replies = 0
+        # bytes received but not consumed yet, possibly several messages
+        self._rxbuf = bytearray()
+        self._scratch = bytearray(_RECV_SIZE)
+        self._scratch_view = memoryview(self._scratch)
         self._connect()
 
     def _find_socket(self):
@@ -37,10 +185,17 @@ class SwayIPC:
     def _connect(self) -> None:
         self.sock.connect(self._find_socket())
 
-    def _send(self, msg_type: int, payload="") -> None:
+    def _pack(self, msg_type: int, payload="") -> bytes:
+        if msg_type == RUN_COMMAND:
+            # Commands change the tree, never serve it from cache afterwards
+            self.invalidate_tree()
+            self._pending_replies += 1
         payload_bytes = payload.encode("utf-8")
-        header = struct.pack("=6sII", b"i3-ipc", len(payload_bytes), msg_type)
-        self.sock.sendall(header + payload_bytes)
+        header = _HEADER.pack(_MAGIC, len(payload_bytes), msg_type)
+        return header + payload_bytes
+
+    def _send(self, msg_type: int, payload="") -> None:
+        self.sock.sendall(self._pack(msg_type, payload))
 
     def read_next_event(self) -> Optional[Dict[str, Any]]:
         """
@@ -49,38 +204,124 @@ class SwayIPC:
         Returns:
             Optional[Dict]: An event dictionary or None on failure.
         """
+        self.invalidate_tree()
         return self._recv()
 
-    def _recv(self) -> Optional[Dict[str, Any]]:
-        buffer = b""
-        while len(buffer) < 14:
-            chunk = self.sock.recv(14 - len(buffer))
-            if not chunk:
+    def iter_events(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield events until the connection is closed.
+
+        Events that arrive together are all decoded from the receive buffer,
+        so a burst of events costs a single recv.
+        """
+        while True:
+            self.invalidate_tree()
+            if not self._skip_pending_replies():
+                return
+            payload = self._recv_payload()
+            if payload is None:
+                return
+            try:
+                event = _json_loads(payload)
+            except ValueError:
+                continue
+            yield event
+
+    def _fill(self) -> bool:
+        """Append what the socket has to the receive buffer, False on EOF"""
+        count = self.sock.recv_into(self._scratch)
+        if not count:
+            return False
+        self._rxbuf += self._scratch_view[:count]
+        return True
+
+    def _recv_into(self, view: memoryview) -> bool:
+        """Fill view completely from the socket, False on EOF"""
+        received = 0
+        while received < len(view):
+            count = self.sock.recv_into(view[received:])
+            if not count:
+                return False
+            received += count
+        return True
+
+    def _peek_header(self) -> Optional[Tuple[int, int]]:
+        """(length, msg_type) of the next message, left in the buffer"""
+        buffer = self._rxbuf
+        while len(buffer) < _HEADER.size:
+            if not self._fill():
                 return None
-            buffer += chunk
-        magic, length, msg_type = struct.unpack("=6sII", buffer[:14])
-        if magic != b"i3-ipc":
+        magic, length, msg_type = _HEADER.unpack_from(buffer)
+        if magic != _MAGIC:
             raise ValueError("Invalid IPC magic")
-        while len(buffer) < 14 + length:
-            chunk = self.sock.recv(length + 14 - len(buffer))
-            if not chunk:
-                return None
-            buffer += chunk
+        return length, msg_type
+
+    def _recv_payload(self) -> Optional[bytearray]:
+        """Payload of the next message, taken from the receive buffer first"""
+        header = self._peek_header()
+        if header is None:
+            return None
+        length = header[0]
+        buffer = self._rxbuf
+
+        end = _HEADER.size + length
+        if len(buffer) >= end:
+            payload = buffer[_HEADER.size : end]
+            del buffer[:end]
+            return payload
+
+        # Large reply: read the rest straight into an exactly sized buffer
+        payload = bytearray(length)
+        buffered = len(buffer) - _HEADER.size
+        payload[:buffered] = buffer[_HEADER.size :]
+        buffer.clear()
+        if not self._recv_into(memoryview(payload)[buffered:]):
+            return None
+        return payload
+
+    def _skip_pending_replies(self) -> bool:
+        # Sway answers every RUN_COMMAND; drop those replies first so they
+        # are not mistaken for the reply to the request being read
+        while self._pending_replies:
+            header = self._peek_header()
+            if header is None:
+                return False
+            if header[1] != RUN_COMMAND:
+                # Events a command triggers arrive before its reply; leave
+                # them queued for this read and skip the reply on a later one
+                return True
+            self._pending_replies -= 1
+            if self._recv_payload() is None:
+                return False
+        return True
+
+    def _recv(self) -> Optional[Dict[str, Any]]:
+        if not self._skip_pending_replies():
+            return None
+
+        payload = self._recv_payload()
+        if payload is None:
+            return None
 
         try:
-            data = json.loads(buffer[14 : 14 + length])
+            data = _json_loads(payload)
             return data
-        except json.JSONDecodeError:
+        except ValueError:
             return None
 
     def is_connected(self) -> bool:
         """
         Check if the Sway socket is still connected.
-        Sends zero-byte data to check if the connection is alive.
+        Looks for a pending socket error, then peeks without blocking to see
+        whether sway has closed its end.
         """
         try:
-            # Try to send 0 bytes (doesn't block or send real data)
-            self.sock.send(b"")
+            if self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                return False
+            # Peeking leaves any pending data for the next read
+            return self.sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) != b""
+        except BlockingIOError:
+            # Nothing to read, but the peer is still there
             return True
         except OSError:
             return False
@@ -97,9 +338,64 @@ class SwayIPC:
         """
         return view.get("shell") == "xwayland"
 
+    @contextmanager
+    def tree_snapshot(self):
+        """
+        Reuse a single get_tree() reply for every helper called inside the block.
+
+        The snapshot is dropped as soon as a command is sent, so queries made
+        after a command always see the updated tree.
+        """
+        self._tree_snapshots += 1
+        try:
+            yield self
+        finally:
+            self._tree_snapshots -= 1
+            if not self._tree_snapshots and not self._tree_kept:
+                self.invalidate_tree()
+
+    def keep_tree(self, keep: bool = True) -> None:
+        """
+        Keep reusing the last get_tree() reply until invalidate_tree() is
+        called or a command is sent. Meant for callers that invalidate the
+        tree on every window, workspace and output event.
+
+        Args:
+            keep (bool): False goes back to fetching the tree on every call.
+        """
+        self._tree_kept = keep
+        if not keep:
+            self.invalidate_tree()
+
+    def invalidate_tree(self) -> None:
+        """Drop the cached tree, so the next get_tree() asks sway again"""
+        with self._tree_lock:
+            self._tree_generation += 1
+            self._tree_cache = None
+            self._id_index = None
+
     def get_tree(self) -> Optional[Dict[str, Any]]:
+        tree = self._tree_cache
+        if tree is not None and (
+            self._tree_snapshots
+            or self._tree_kept
+            or time.monotonic() - self._tree_ts < self._tree_ttl
+        ):
+            return tree
+        return self._fetch_tree()
+
+    def _fetch_tree(self) -> Optional[Dict[str, Any]]:
+        generation = self._tree_generation
         self._send(GET_TREE)
-        return self._recv()
+        tree = self._recv()
+        cached = self._tree_snapshots or self._tree_kept or self._tree_ttl > 0
+        if cached and hasattr(tree, "get"):
+            with self._tree_lock:
+                # Don't keep a tree that an invalidation may already have outdated
+                if generation == self._tree_generation:
+                    self._tree_cache = tree
+                    self._tree_ts = time.monotonic()
+        return tree
 
     def run_command(self, cmd: str) -> None:
         """
@@ -107,6 +403,16 @@ class SwayIPC:
         """
         self._send(0, cmd)
 
+    def batch(self) -> "CommandBatch":
+        """
+        Collect several commands and run them as a single IPC message.
+
+        Returns:
+            CommandBatch: Sends its commands on send() or when its with
+            block exits without an error.
+        """
+        return CommandBatch(self)
+
     def list_seats(self) -> Optional[Dict[str, Any]]:
         """
         Get list of available seats with their capabilities.
@@ -142,7 +448,7 @@ class SwayIPC:
             self._send(0, f"[id={view_id}] kill")
             return True
         except Exception as e:
-            print(f"[ERROR] Failed to close view {view_id}: {e}")
+            log.error("Failed to close view %s: %s", view_id, e)
             return False
 
     def set_view_alpha(self, view_id: int, opacity: float) -> None:
@@ -160,23 +466,20 @@ class SwayIPC:
     def set_workspace(
         self, x: int, y: int, view_id: Optional[int] = None
     ) -> Optional[bool]:
-        tree = self.get_tree()
-        if tree:
-            outputs = [o for o in tree.get("nodes", []) if o.get("type") == "output"]
-
+        # GET_OUTPUTS carries rect and current_workspace without the subtrees
+        outputs = self._get_outputs()
+        if outputs is not None:
             for output in outputs:
-                geometry = output.get("rect", {})
-                ox = geometry.get("x", 0)
-                oy = geometry.get("y", 0)
-                width = geometry.get("width", 1920)
-                height = geometry.get("height", 1080)
-
+                rect = output.get("rect")
+                workspace = output.get("current_workspace")
+                # Disabled outputs have no workspace and a zero rect
+                if not rect or not workspace:
+                    continue
+
+                ox = rect["x"]
+                oy = rect["y"]
                 # Check if point (x, y) is inside this output
-                if ox <= x < ox + width and oy <= y < oy + height:
-                    workspace = output.get("current_workspace")
-                    if not workspace:
-                        continue
-
+                if ox <= x < ox + rect["width"] and oy <= y < oy + rect["height"]:
                     if view_id is None:
                         return self._send(0, f"workspace {workspace}")
                     else:
@@ -209,9 +512,9 @@ class SwayIPC:
         Returns:
             bool: True if successful
         """
-        view = self.get_view(view_id)
+        view = self.get_view(view_id, timeout=0)
         if not view:
-            print(f"View {view_id} not found")
+            log.warning("View %s not found", view_id)
             return False
 
         if self.is_xwayland_view(view):
@@ -219,23 +522,27 @@ class SwayIPC:
         else:
             selector = f"[con_id={view_id}]"
 
-        try:
-            # Optionally move to a specific output first
-            if output_id is not None:
-                self._send(0, f"{selector} move to output id {output_id}")
+        commands = []
+        # Optionally move to a specific output first
+        if output_id is not None:
+            commands.append(f"{selector} move to output id {output_id}")
 
-            # Set absolute position and size
-            self._send(0, f"{selector} floating enable")
+        # Set absolute position and size
+        commands.append(f"{selector} floating enable")
 
-            # skip moving the view
-            if x > 0 or y > 0:
-                self._send(0, f"{selector} move position {x} {y}")
+        # skip moving the view
+        if x > 0 or y > 0:
+            commands.append(f"{selector} move position {x} {y}")
 
-            self._send(0, f"{selector} resize set {w} {h}")
+        commands.append(f"{selector} resize set {w} {h}")
 
+        try:
+            with self.batch() as batch:
+                for cmd in commands:
+                    batch.add(cmd)
             return True
         except Exception as e:
-            print(f"[ERROR] Failed to configure view {view_id}: {e}")
+            log.error("Failed to configure view %s: %s", view_id, e)
             return False
 
     def list_input_devices(self) -> Optional[Dict[str, Any]]:
@@ -249,72 +556,114 @@ class SwayIPC:
         response = self._recv()
         return response
 
-    def list_views(self) -> List[Dict[str, Any]]:
-        """Extract all views with titles and app_ids"""
-        views = []
-
-        def traverse(node) -> Optional[Dict[str, Any]]:
-            if isinstance(node, dict):
-                # Real view condition based on sway's IPC tree
-                if node.get("type") in ["con", "floating_con"]:
-                    if node.get("id"):
-                        views.append(node)
-                for child in node.get("nodes", []) + node.get("floating_nodes", []):
-                    traverse(child)
+    def list_views(self, tree: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Extract all views with titles and app_ids
 
-        tree = self.get_tree()
-        traverse(tree)
-        return views
+        Args:
+            tree (Optional[Dict]): Already fetched tree to read from, instead
+                of calling get_tree()
+        """
+        if tree is None:
+            tree = self.get_tree()
+        # Real view condition based on sway's IPC tree
+        return [
+            node
+            for node in _walk(tree)
+            if node.get("type") in _VIEW_TYPES and node.get("id")
+        ]
 
-    def get_view(self, view_id: int, max_retries=10) -> Optional[Dict[str, Any]]:
+    def get_view(
+        self, view_id: int, *, timeout: float = 0.5
+    ) -> Optional[Dict[str, Any]]:
         """
-        Get a view by ID with retry logic to handle async updates
+        Get a view by ID, waiting for it if it is not in the tree yet
 
         Args:
             view_id (int): ID of the view to find
-            max_retries (int): Maximum number of times to try
-            delay (float): Time to wait between retries
+            timeout (float): Seconds to wait for sway to report the view when
+                it is missing, e.g. right after it was created. 0 doesn't wait.
+                Keyword-only, so an old positional max_retries isn't taken
+                for seconds.
 
         Returns:
             Optional[Dict]: View data if found, None otherwise
         """
-        # for some reason sway doesn't always return the view when using get_tree
-        # this is a temporary solution to make it always return the view
-        for attempt in range(max_retries):
-            tree = self.get_tree()
-            if not tree:
-                continue
-
-            def traverse(node):
-                if isinstance(node, dict):
-                    if node.get("id") == view_id:
-                        return node
-                    for child in node.get("nodes", []) + node.get("floating_nodes", []):
-                        result = traverse(child)
-                        if result:
-                            return result
-                return None
-
-            result = traverse(tree)
-            if result:
-                return result
+        tree = self.get_tree()
+        if tree:
+            view = self._find_view(tree, view_id)
+            if view:
+                return view
+        if timeout <= 0:
+            return None
+        return self._await_view(view_id, timeout)
 
-        return None
+    def _find_view(
+        self, tree: Dict[str, Any], view_id: int
+    ) -> Optional[Dict[str, Any]]:
+        if tree is self._tree_cache:
+            # The tree will be asked again, index it once
+            return self._id_index_for(tree).get(view_id)
+        return next((n for n in _walk(tree) if n.get("id") == view_id), None)
 
-    def get_focused_view(self) -> Optional[Dict[str, Any]]:
-        tree = self.get_tree()
+    def _await_view(self, view_id: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Wait for a window event about view_id instead of polling the tree.
 
-        def traverse(node):
-            if isinstance(node, dict):
-                if node.get("focused"):
-                    return node
-                for child in node.get("nodes", []) + node.get("floating_nodes", []):
-                    result = traverse(child)
-                    if result:
-                        return result
+        Sway may not list a view in the tree until shortly after it reports it,
+        so listen on a second connection and take the container from the event.
+        """
+        deadline = time.monotonic() + timeout
+        events = SwayIPC()
+        try:
+            events.watch(["window"])
+            # The view may have appeared while subscribing
+            tree = self._fetch_tree()
+            if tree:
+                view = self._find_view(tree, view_id)
+                if view:
+                    return view
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                events.sock.settimeout(remaining)
+                event = events.read_next_event()
+                if event is None:
+                    return None
+                container = event.get("container")
+                if (
+                    container
+                    and container.get("id") == view_id
+                    and event.get("change") != "close"
+                ):
+                    return container
+        except (OSError, RuntimeError):
+            # Timed out (socket.timeout is an OSError), or lost the connection
             return None
+        finally:
+            events.close()
+
+    def _id_index_for(self, tree: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+        """id -> node index of tree, kept until another tree is indexed"""
+        if self._id_index is None or self._id_index[0] is not tree:
+            self._id_index = (tree, {n.get("id"): n for n in _walk(tree)})
+        return self._id_index[1]
 
-        return traverse(tree)
+    def get_focused_view(
+        self, tree: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Args:
+            tree (Optional[Dict]): Already fetched tree to read from, instead
+                of calling get_tree()
+        """
+        if tree is None:
+            tree = self.get_tree()
+        node = _follow_focus(tree)
+        if node is not None:
+            return node
+        return next((n for n in _walk(tree) if n.get("focused")), None)
 
     def get_output(
         self, output_id: int, key=None, max_retries=100
@@ -329,7 +678,7 @@ class SwayIPC:
                 if tree:
                     outputs = [
                         node
-                        for node in tree.get("nodes", [])
+                        for node in tree.get("nodes", ())
                         if node.get("type") == "output"
                     ]
 
@@ -338,21 +687,38 @@ class SwayIPC:
                             return output if key is None else output.get(key)
                 return None
 
+    def _get_outputs(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        GET_OUTPUTS reply: one entry per output with its id, name, rect,
+        focused flag and current_workspace, but none of the workspace/view
+        subtrees that make GET_TREE replies large.
+        """
+        self._send(GET_OUTPUTS)
+        outputs = self._recv()
+        return outputs if isinstance(outputs, list) else None
+
     def get_focused_output(self, max_retries=100):
-        """Return the currently focused output using root 'focus' list"""
-        tree = None
+        """Return the ID of the currently focused output"""
         for attempt in range(max_retries):
-            tree = self.get_tree()
-            if not hasattr(tree, "get"):
+            outputs = self._get_outputs()
+            if outputs is None:
                 continue
-            else:
-                if hasattr(tree, "get"):
-                    return tree.get("focus", [None])[0]
+            return next((o.get("id") for o in outputs if o.get("focused")), None)
 
     def list_outputs(self) -> Optional[List[Dict[str, Any]]]:
         """List all outputs (outputs are top-level nodes with type == 'output')"""
         tree = self.get_tree()
-        return [node for node in tree.get("nodes", []) if node.get("type") == "output"]
+        return [node for node in tree.get("nodes", ()) if node.get("type") == "output"]
+
+    def list_workspaces(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get the flat list of workspaces, without their child nodes.
+
+        Returns:
+            List of workspace dictionaries or None if failed.
+        """
+        self._send(GET_WORKSPACES)
+        return self._recv()
 
     def focus_output(self, output_id) -> None:
         """Focus an output by ID using Sway command"""
@@ -401,7 +767,7 @@ class SwayIPC:
         try:
             self._send(0, f"[id={view_id}] focus")
         except Exception as e:
-            print(f"[ERROR] Failed to focus view {view_id}: {e}")
+            log.error("Failed to focus view %s: %s", view_id, e)
 
     def watch(self, events=None):
         """
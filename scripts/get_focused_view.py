@@ -1,7 +1,11 @@
+from pysway import daemon
 from pysway.ipc import SwayIPC
 
-sway = SwayIPC()
-focused = sway.get_focused_view()
+try:
+    focused = daemon.query("FOCUSED")
+except OSError:
+    # pysway-daemon is not running, ask sway directly
+    focused = SwayIPC().get_focused_view()
 
 if focused:
     print("Focused View:")
@@ -1,8 +1,13 @@
+from pysway import daemon
 from pysway.ipc import SwayIPC
 import json
 
-sway = SwayIPC()
-view = sway.get_view(8)  # Replace with real view ID
+view_id = 8  # Replace with real view ID
+try:
+    view = daemon.query("VIEW", str(view_id))
+except OSError:
+    # pysway-daemon is not running, ask sway directly
+    view = SwayIPC().get_view(view_id)
 
 if view:
     print(json.dumps(view, indent=2))
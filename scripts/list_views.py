@@ -1,8 +1,13 @@
+from pysway import daemon
 from pysway.ipc import SwayIPC
 
-ipc = SwayIPC()
-tree = ipc.get_tree()
-views = ipc.list_views(tree)
+try:
+    views = daemon.query("VIEWS")
+except OSError:
+    # pysway-daemon is not running, ask sway directly
+    ipc = SwayIPC()
+    tree = ipc.get_tree()
+    views = ipc.list_views(tree)
 
 print("Open Views:")
 print("-" * 60)